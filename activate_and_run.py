@@ -7,10 +7,53 @@ import os
 import sys
 import subprocess
 import platform
+import json
+
+VENV_NAME = "photo_restoration_env"
+VENV_CACHE_FILE = ".venv_cache.json"
+
+# Python path resolved by activate_venv(), reused for later commands
+_python_path = None
+
+def _load_cached_python_path(venv_name):
+    """Return the python path saved by a previous run, if still valid"""
+    # A parent process may already have resolved it for us
+    python_path = os.environ.get("PHOTO_RESTORATION_PY")
+    if not python_path:
+        try:
+            with open(VENV_CACHE_FILE) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get("venv_name") != venv_name:
+            return None
+        python_path = cache.get("python_path")
+    
+    if python_path and os.path.exists(python_path):
+        return python_path
+    return None
+
+def _save_cached_python_path(venv_name, python_path):
+    """Persist the resolved python path for later runs"""
+    try:
+        with open(VENV_CACHE_FILE, "w") as f:
+            json.dump({"venv_name": venv_name, "python_path": python_path}, f)
+    except OSError as e:
+        print(f"Warning: could not write {VENV_CACHE_FILE}: {e}")
 
 def activate_venv():
     """Activate the virtual environment"""
-    venv_name = "photo_restoration_env"
+    global _python_path
+    if _python_path:
+        return _python_path
+    
+    venv_name = VENV_NAME
+    
+    python_path = _load_cached_python_path(venv_name)
+    if python_path:
+        _python_path = python_path
+        os.environ["PHOTO_RESTORATION_PY"] = python_path
+        return python_path
     
     if not os.path.exists(venv_name):
         print(f"Virtual environment '{venv_name}' not found!")
@@ -32,21 +75,48 @@ def activate_venv():
     print(f"Virtual environment activated: {venv_name}")
     print(f"Python path: {python_path}")
     
+    # Cache the result for this process, child scripts and later runs
+    _python_path = python_path
+    os.environ["PHOTO_RESTORATION_PY"] = python_path
+    _save_cached_python_path(venv_name, python_path)
+    
     return python_path
 
-def run_restoration_interactive():
-    """Run the interactive photo restoration"""
+def run_script(cmd):
+    """Run cmd in place of this process
+    
+    On POSIX the current process is replaced with os.execv, so this only
+    returns if the exec fails (by raising OSError) and the caller's exit
+    code is the script's own. On Windows, where exec spawns a detached
+    process, the script is run as a child and its success is returned.
+    """
+    if platform.system() != "Windows":
+        # Buffered output is lost once the process image is replaced
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(cmd[0], cmd)
+    
+    result = subprocess.run(cmd)
+    return result.returncode == 0
+
+def run_restoration_interactive(input_folder=None, output_folder=None):
+    """Run the interactive photo restoration
+    
+    When both folders are given, the whole input folder is restored in a
+    single run without prompting.
+    """
     python_path = activate_venv()
     if not python_path:
         return False
     
     # Run the interactive restoration script
     cmd = [python_path, "run_restoration.py"]
+    if input_folder and output_folder:
+        cmd += [input_folder, output_folder]
     print(f"Running: {' '.join(cmd)}")
     
     try:
-        result = subprocess.run(cmd)
-        return result.returncode == 0
+        return run_script(cmd)
     except Exception as e:
         print(f"Error running restoration: {e}")
         return False
@@ -62,8 +132,7 @@ def run_test():
     print(f"Running: {' '.join(cmd)}")
     
     try:
-        result = subprocess.run(cmd)
-        return result.returncode == 0
+        return run_script(cmd)
     except Exception as e:
         print(f"Error running test: {e}")
         return False
@@ -79,10 +148,10 @@ def main():
         if command == "test":
             return run_test()
         elif command == "run":
-            return run_restoration_interactive()
+            return run_restoration_interactive(*sys.argv[2:4])
         else:
             print(f"Unknown command: {command}")
-            print("Available commands: test, run")
+            print("Available commands: test, run [input_folder output_folder]")
             return False
     else:
         # Interactive mode
@@ -10,12 +10,37 @@ import tempfile
 import shutil
 from pathlib import Path
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import time
+import functools
+import math
+import threading
+import collections
+import uuid
+import logging
+import base64
+import hashlib
+import io
+import datetime
+import atexit
+import re
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional; image_contrast falls back to NumPy without it
+    njit = None
 
 # Import our photo restoration functions
 from photo_restoration_runner import restore_photos, make_grid
 
+log = logging.getLogger(__name__)
+
+# File names the app treats as images (case-insensitive)
+_IMG_EXT_RE = re.compile(r'\.(?:jpe?g|png|bmp|tiff?)$', re.IGNORECASE)
+
 def check_model_files():
     """Check if required model files and directories exist"""
     required = [
@@ -26,20 +51,28 @@ def check_model_files():
     ]
     results = []
     for name, path in required:
-        if os.path.exists(path):
-            if os.path.isdir(path):
-                count = len(os.listdir(path))
-                if count > 0:
-                    results.append((name, path, True, f"Directory with {count} files"))
-                else:
-                    results.append((name, path, False, "Directory is empty"))
+        # One stat answers exists / isdir / size
+        try:
+            st = os.stat(path)
+        except OSError:
+            results.append((name, path, False, "Missing"))
+            continue
+        
+        if stat.S_ISDIR(st.st_mode):
+            count = _dir_entry_count(path, st.st_mtime_ns)
+            if count > 0:
+                results.append((name, path, True, f"Directory with {count} files"))
             else:
-                size = os.path.getsize(path)
-                results.append((name, path, True, f"File size: {size} bytes"))
+                results.append((name, path, False, "Directory is empty"))
         else:
-            results.append((name, path, False, "Missing"))
+            results.append((name, path, True, f"File size: {st.st_size} bytes"))
     return results
 
+@functools.lru_cache(maxsize=16)
+def _dir_entry_count(path, mtime_ns):
+    """Number of entries in path; a new directory mtime invalidates the cache"""
+    return len(os.listdir(path))
+
 def debug_check_setup():
     """Gradio function to check setup and return a markdown report"""
     results = check_model_files()
@@ -57,35 +90,50 @@ def debug_check_setup():
         report += "\n---\n**Some files or models are missing. Please run `setup_environment.py` again.**\n"
     return report
 
-def create_slider_comparison(original_image, restored_image):
-    """
-    Create a slider comparison between original and restored images
-    
-    Args:
-        original_image: PIL Image of original
-        restored_image: PIL Image of restored
-    
-    Returns:
-        HTML string for slider comparison
-    """
-    if original_image is None or restored_image is None:
-        return "No images to compare"
-    
-    # Convert images to base64 for HTML embedding
-    import base64
-    import io
-    
-    def image_to_base64(img):
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        return img_str
+def _encode_jpeg_b64(img):
+    """Encode an image as a base64 JPEG for embedding in HTML"""
+    # The slider is at most 600px wide, so larger images only cost bytes
+    if img.width > 1200:
+        img = img.copy()
+        img.thumbnail((1200, img.height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.convert('RGB').save(buffer, format='JPEG', quality=85, optimize=False)
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
+
+# Base64 JPEGs of recently shown images, keyed by a digest of their pixels,
+# least recently used first
+_B64_CACHE = collections.OrderedDict()
+_B64_CACHE_SIZE = 32
+_b64_lock = threading.Lock()
+
+def image_to_b64(img):
+    """Base64 JPEG of img, reusing the encoding when the pixels are unchanged"""
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    # Very large images skip the cache; reading their pixels for the key
+    # would cost about as much as encoding the downscaled JPEG
+    if img.width * img.height > 4_000_000:
+        return _encode_jpeg_b64(img)
     
-    original_b64 = image_to_base64(original_image)
-    restored_b64 = image_to_base64(restored_image)
+    # Only a 16-byte digest is kept per entry, not the pixels themselves
+    digest = hashlib.blake2b(img.tobytes(), digest_size=16).digest()
+    key = (img.size, img.mode, digest)
+    with _b64_lock:
+        encoded = _B64_CACHE.get(key)
+        if encoded is not None:
+            _B64_CACHE.move_to_end(key)
+            return encoded
     
-    # Create HTML with CSS for slider comparison
-    html = f"""
+    encoded = _encode_jpeg_b64(img)
+    with _b64_lock:
+        _B64_CACHE[key] = encoded
+        while len(_B64_CACHE) > _B64_CACHE_SIZE:
+            _B64_CACHE.popitem(last=False)
+    return encoded
+
+# HTML/CSS/JS for the before/after slider; literal braces are doubled for
+# str.format, which fills in original_b64 and restored_b64
+_SLIDER_HTML = """
     <style>
     .comparison-container {{
         position: relative;
@@ -169,8 +217,8 @@ def create_slider_comparison(original_image, restored_image):
     </style>
     
     <div class="comparison-container" id="comparison-container">
-        <img src="data:image/png;base64,{original_b64}" class="comparison-before" alt="Before">
-        <img src="data:image/png;base64,{restored_b64}" class="comparison-after" alt="After" id="after-image">
+        <img src="data:image/jpeg;base64,{original_b64}" class="comparison-before" alt="Before">
+        <img src="data:image/jpeg;base64,{restored_b64}" class="comparison-after" alt="After" id="after-image">
         <div class="comparison-slider" id="slider"></div>
         <div class="comparison-labels">
             <span>Before</span>
@@ -215,15 +263,228 @@ def create_slider_comparison(original_image, restored_image):
     }});
     </script>
     """
+
+def create_slider_comparison(original_image, restored_image):
+    """
+    Create a slider comparison between original and restored images
+    
+    Args:
+        original_image: PIL Image of original
+        restored_image: PIL Image of restored
+    
+    Returns:
+        HTML string for slider comparison
+    """
+    if original_image is None or restored_image is None:
+        return "No images to compare"
+    
+    # Convert images to base64 for HTML embedding
+    original_b64 = image_to_b64(original_image)
+    restored_b64 = image_to_b64(restored_image)
+    
+    # Fill in the HTML/CSS/JS template for the slider comparison
+    return _SLIDER_HTML.format(original_b64=original_b64, restored_b64=restored_b64)
+
+# Persistent scratch space shared by all requests. Each request works in its
+# own subfolder, removed when done; anything left is removed at exit.
+_SCRATCH = tempfile.mkdtemp(prefix="photorestore_")
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+
+def new_scratch_dir():
+    """Create and return a fresh per-request folder inside the scratch space"""
+    path = os.path.join(_SCRATCH, uuid.uuid4().hex)
+    os.makedirs(path)
+    return path
+
+# Single-image requests arriving within BATCH_WINDOW seconds of each other
+# (with the same options) are restored together in one restore_photos call,
+# so the models are loaded once per batch instead of once per image
+BATCH_WINDOW = 0.5
+
+_batch_lock = threading.Lock()
+_pending_batches = {}  # (gpu_id, with_scratch, hr) -> batch still accepting images
+
+def _run_batch(key):
+    """Timer callback: close the batch for key and restore all its images"""
+    with _batch_lock:
+        batch = _pending_batches.pop(key)
+    
+    gpu_id, with_scratch, hr = key
+    log.debug("Restoring a batch of %d image(s)", len(batch["jobs"]))
+    try:
+        success = restore_photos(
+            input_folder=batch["input_dir"],
+            output_folder=batch["output_dir"],
+            gpu_id=gpu_id,
+            with_scratch=with_scratch,
+            hr=hr
+        )
+        for name in batch["jobs"]:
+            batch["results"][name] = (batch["output_dir"], success)
+        
+        # One bad upload must not fail everyone else's request, so when a
+        # shared run fails, restore each image again on its own
+        if not success and len(batch["jobs"]) > 1:
+            log.warning("Batch of %d images failed, retrying them one by one", len(batch["jobs"]))
+            for name, input_path in batch["jobs"].items():
+                job_dir = os.path.join(batch["temp_dir"], name)
+                job_input = os.path.join(job_dir, "input")
+                job_output = os.path.join(job_dir, "output")
+                os.makedirs(job_input)
+                _stage(input_path, os.path.join(job_input, os.path.basename(input_path)))
+                batch["results"][name] = (job_output, restore_photos(
+                    input_folder=job_input,
+                    output_folder=job_output,
+                    gpu_id=gpu_id,
+                    with_scratch=with_scratch,
+                    hr=hr
+                ))
+    finally:
+        batch["done"].set()
+
+def restore_in_batch(image_path, image, gpu_id, with_scratch, hr):
+    """
+    Queue an image for restoration and wait for its batch to finish
+    
+    Args:
+        image_path: The uploaded file
+        image: The same file opened with PIL
+    
+    Returns:
+        tuple: (batch, name) where name is the file stem of this image within
+        the batch and batch["results"].get(name) is its (output_dir, success).
+        Call release_batch(batch) once done reading the results.
+    """
+    key = (gpu_id, with_scratch, hr)
+    
+    # Staged into a folder of its own first, so the encode does not hold up
+    # every other request waiting on the lock
+    name = f"uploaded_image_{uuid.uuid4().hex[:12]}"
+    staging_dir = new_scratch_dir()
+    try:
+        ext = os.path.splitext(image_path)[1].lower()
+        upright = image.getexif().get(0x0112, 1) == 1  # EXIF orientation
+        if image.format in ('PNG', 'JPEG') and ext in ('.png', '.jpg', '.jpeg') and upright:
+            # PNG and JPEG uploads are restored from the uploaded file itself,
+            # with nothing lost to a re-encode
+            staged_path = os.path.join(staging_dir, name + ext)
+            _stage(image_path, staged_path)
+        else:
+            # Other formats, and rotated photos, are converted; quality 95
+            # with full chroma is visually lossless at a fraction of the size
+            # of quality 100
+            staged_path = os.path.join(staging_dir, name + ".jpg")
+            ImageOps.exif_transpose(image).convert('RGB').save(
+                staged_path, format='JPEG', quality=95, subsampling=0, optimize=False)
+        
+        with _batch_lock:
+            batch = _pending_batches.get(key)
+            new_batch = batch is None
+            if new_batch:
+                temp_dir = new_scratch_dir()
+                batch = {
+                    "temp_dir": temp_dir,
+                    "input_dir": os.path.join(temp_dir, "input"),
+                    "output_dir": os.path.join(temp_dir, "output"),
+                    "jobs": collections.OrderedDict(),
+                    "done": threading.Event(),
+                    "results": {},
+                    "users": 0,
+                }
+            
+            # Moved in while holding the lock so it is in place before the
+            # batch runs; a rename within the scratch space is instant
+            input_path = os.path.join(batch["input_dir"], os.path.basename(staged_path))
+            try:
+                if new_batch:
+                    os.makedirs(batch["input_dir"])
+                    os.makedirs(batch["output_dir"])
+                os.replace(staged_path, input_path)
+            except OSError:
+                if new_batch:
+                    shutil.rmtree(batch["temp_dir"], ignore_errors=True)
+                raise
+            
+            batch["jobs"][name] = input_path
+            batch["users"] += 1
+            if new_batch:
+                _pending_batches[key] = batch
+                threading.Timer(BATCH_WINDOW, _run_batch, args=(key,)).start()
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    log.debug("Saved input image to: %s", input_path)
+    batch["done"].wait()
+    return batch, name
+
+def release_batch(batch):
+    """Drop one reference to a batch, removing its files after the last one"""
+    with _batch_lock:
+        batch["users"] -= 1
+        last = batch["users"] == 0
+    if last:
+        shutil.rmtree(batch["temp_dir"], ignore_errors=True)
+
+# Where restore_photos may leave results, relative to its output folder,
+# in order of preference
+RESULT_DIRS = (
+    "final_output",
+    "",
+    "restored_image",
+    os.path.join("stage_1_restore_output", "restored_image"),
+    os.path.join("stage_1_restore_output", "origin"),
+    os.path.join("stage_3_face_output", "each_img"),
+)
+
+# Final-result folder that worked last time, per (with_scratch, hr). Only the
+# first three RESULT_DIRS are remembered: the stage_* fallbacks mean that one
+# image did not make it through the whole pipeline, which says nothing about
+# where the next image's result will land.
+_OUTPUT_PATH_CACHE = {}
+
+def _find_restored(output_dir, name, cache_key=None):
+    """
+    Find the restored image for the input file stem name
+    
+    Folders are tried in RESULT_DIRS order with one scandir each, stopping at
+    the first that holds an image for name; within a folder, an exact name
+    match (any extension) is preferred over other files starting with name.
+    The folder that held the result last time for cache_key is tried first.
+    
+    Returns:
+        str or None: Path of the restored image
+    """
+    cached = _OUTPUT_PATH_CACHE.get(cache_key)
+    subdirs = RESULT_DIRS
+    if cached is not None:
+        subdirs = (cached,) + tuple(d for d in RESULT_DIRS if d != cached)
     
-    return html
+    for subdir in subdirs:
+        try:
+            with os.scandir(os.path.join(output_dir, subdir)) as it:
+                matches = [entry for entry in it
+                           if entry.name.startswith(name)
+                           and _IMG_EXT_RE.search(entry.name)
+                           and entry.is_file()]
+        except OSError:
+            continue
+        if not matches:
+            continue
+        
+        if cache_key is not None and subdir in RESULT_DIRS[:3]:
+            _OUTPUT_PATH_CACHE[cache_key] = subdir
+        for entry in matches:
+            if os.path.splitext(entry.name)[0] == name:
+                return entry.path
+        return matches[0].path
+    return None
 
-def process_single_image(image, use_gpu, with_scratch, high_resolution):
+def process_single_image(image_path, use_gpu, with_scratch, high_resolution):
     """
     Process a single uploaded image
     
     Args:
-        image: PIL Image object from Gradio
+        image_path: Path of the uploaded file from Gradio
         use_gpu: Boolean for GPU usage
         with_scratch: Boolean for scratch removal
         high_resolution: Boolean for high resolution mode
@@ -231,127 +492,117 @@ def process_single_image(image, use_gpu, with_scratch, high_resolution):
     Returns:
         tuple: (original_image, restored_image, download_path)
     """
-    if image is None:
+    if image_path is None:
         return None, None, None
     
-    # Create temporary directories
-    with tempfile.TemporaryDirectory() as temp_dir:
-        input_dir = os.path.join(temp_dir, "input")
-        output_dir = os.path.join(temp_dir, "output")
-        
-        os.makedirs(input_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Save uploaded image with original quality
-        input_path = os.path.join(input_dir, "uploaded_image.jpg")
-        image.save(input_path, quality=100)  # Maximum quality
-        
-        print(f"Saved input image to: {input_path}")
-        print(f"Input directory contents: {os.listdir(input_dir)}")
-        print(f"Image size: {image.size}, Mode: {image.mode}")
-        
-        # Set GPU ID
-        gpu_id = 0 if use_gpu else -1
-        
-        # Process the image
-        print(f"Processing image with GPU: {use_gpu}, Scratch removal: {with_scratch}, High res: {high_resolution}")
-        
-        success = restore_photos(
-            input_folder=input_dir,
-            output_folder=output_dir,
-            gpu_id=gpu_id,
-            with_scratch=with_scratch,
-            hr=high_resolution
-        )
+    # Only the header is read here; pixels are decoded for the preview
+    image = Image.open(image_path)
+    log.debug("Image size: %s, Mode: %s, Format: %s", image.size, image.mode, image.format)
+    
+    # Set GPU ID
+    gpu_id = 0 if use_gpu else -1
+    
+    # Process the image, together with any other requests arriving meanwhile
+    log.debug("Processing image with GPU: %s, Scratch removal: %s, High res: %s",
+              use_gpu, with_scratch, high_resolution)
+    
+    batch, name = restore_in_batch(image_path, image, gpu_id, with_scratch, high_resolution)
+    try:
+        # No entry means the batch run itself raised
+        output_dir, success = batch["results"].get(name, (batch["output_dir"], False))
         
-        print(f"Restoration success: {success}")
-        print(f"Output directory contents: {os.listdir(output_dir) if os.path.exists(output_dir) else 'Output dir not found'}")
+        log.debug("Restoration success: %s", success)
         
         if not success:
-            print("Restoration failed, returning None")
+            log.warning("Restoration failed, returning None")
             return None, None, None
         
-        # Check each stage for debugging
-        stage_dirs = ["stage_1_restore_output", "stage_2_detection_output", "stage_3_face_output", "final_output"]
-        for stage in stage_dirs:
-            stage_path = os.path.join(output_dir, stage)
-            if os.path.exists(stage_path):
-                contents = os.listdir(stage_path)
-                print(f"Stage {stage}: {len(contents)} items")
-                if contents:
-                    print(f"  Contents: {contents}")
-                    # Check subdirectories
-                    for item in contents:
-                        item_path = os.path.join(stage_path, item)
-                        if os.path.isdir(item_path):
-                            sub_contents = os.listdir(item_path)
-                            print(f"    {item}/: {sub_contents}")
+        # Check each stage for debugging (skipped entirely, directory listings
+        # included, unless debug logging is on, e.g. via PHOTO_RESTORE_DEBUG)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Output directory contents: %s", os.listdir(output_dir))
+            stage_dirs = ["stage_1_restore_output", "stage_2_detection_output", "stage_3_face_output", "final_output"]
+            for stage in stage_dirs:
+                stage_path = os.path.join(output_dir, stage)
+                if os.path.exists(stage_path):
+                    contents = os.listdir(stage_path)
+                    log.debug("Stage %s: %d items", stage, len(contents))
+                    if contents:
+                        log.debug("  Contents: %s", contents)
+                        # Check subdirectories
+                        for item in contents:
+                            item_path = os.path.join(stage_path, item)
+                            if os.path.isdir(item_path):
+                                sub_contents = os.listdir(item_path)
+                                log.debug("    %s/: %s", item, sub_contents)
         
         # Load results - check multiple possible output locations
-        possible_output_dirs = [
-            os.path.join(output_dir, "final_output"),
-            output_dir,
-            os.path.join(output_dir, "restored_image"),
-            os.path.join(output_dir, "stage_1_restore_output", "restored_image"),
-            os.path.join(output_dir, "stage_1_restore_output", "origin"),
-            os.path.join(output_dir, "stage_3_face_output", "each_img")
-        ]
-        
+        restored_path = _find_restored(output_dir, name, cache_key=(with_scratch, high_resolution))
         restored_image = None
-        restored_path = None
-        for output_subdir in possible_output_dirs:
-            print(f"Checking for results in: {output_subdir}")
-            if os.path.exists(output_subdir):
-                print(f"Found output directory: {output_subdir}")
-                contents = os.listdir(output_subdir)
-                print(f"Contents: {contents}")
-                
-                # Look for restored image
-                test_path = os.path.join(output_subdir, "uploaded_image.jpg")
-                if os.path.exists(test_path):
-                    print(f"Found restored image at: {test_path}")
-                    restored_image = Image.open(test_path)
-                    restored_path = test_path
-                    break
-                else:
-                    # Check for any image files
-                    for file in contents:
-                        if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-                            test_path = os.path.join(output_subdir, file)
-                            print(f"Found image file: {test_path}")
-                            restored_image = Image.open(test_path)
-                            restored_path = test_path
-                            break
-                    if restored_image:
-                        break
+        if restored_path:
+            log.debug("Found restored image at: %s", restored_path)
+            restored_image = Image.open(restored_path)
         
         if restored_image:
-            print("Creating high-quality download file")
+            log.debug("Creating high-quality download file")
             
             # Create a permanent download directory
             download_dir = "downloads"
             os.makedirs(download_dir, exist_ok=True)
             
-            # Generate unique filename with timestamp
-            import datetime
+            # Generate unique filename with timestamp; requests from the same
+            # batch finish together, so add the per-request suffix as well
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            download_filename = f"restored_photo_{timestamp}.jpg"
+            download_filename = f"restored_photo_{timestamp}_{name[-6:]}.jpg"
             download_path = os.path.join(download_dir, download_filename)
             
-            # Save restored image with maximum quality
-            restored_image.save(download_path, quality=100, optimize=False)
-            print(f"Saved high-quality restored image to: {download_path}")
+            # A JPEG result is linked (or copied) as-is, avoiding a lossy
+            # decode + re-encode; other formats are converted at max quality
+            if os.path.splitext(restored_path)[1].lower() in ('.jpg', '.jpeg'):
+                try:
+                    os.link(restored_path, download_path)
+                except OSError:
+                    shutil.copyfile(restored_path, download_path)
+            else:
+                restored_image.save(download_path, quality=100, optimize=False)
+            log.debug("Saved high-quality restored image to: %s", download_path)
+            
+            # Decode now, before the batch output directory is removed
+            restored_image.load()
+            
+            # The original is only shown in a 300px-high preview, so send a
+            # downscaled copy instead of the full-resolution upload; for a
+            # JPEG not yet decoded, draft lets the decoder scale it down by
+            # 1/2-1/8 as it reads. Staging is finished by now, so this only
+            # affects the preview
+            image.draft(image.mode, (600, 600))
+            preview = ImageOps.exif_transpose(image)
+            preview.thumbnail((600, 600))
             
-            print("Returning original and restored images for comparison")
-            return image, restored_image, download_path
+            log.debug("Returning original and restored images for comparison")
+            return preview, restored_image, download_path
         else:
-            print("No restored image found")
-            print("Possible reasons:")
-            print("1. No face detected in the image")
-            print("2. Image quality too poor for processing")
-            print("3. Image size or format not supported")
-            print("4. Face detection failed")
+            log.warning(
+                "No restored image found. Possible reasons:\n"
+                "1. No face detected in the image\n"
+                "2. Image quality too poor for processing\n"
+                "3. Image size or format not supported\n"
+                "4. Face detection failed"
+            )
             return None, None, None
+    finally:
+        release_batch(batch)
+
+def _stage(src, dst):
+    """Place an uploaded file into the input folder without copying it
+    
+    Hard-links when possible; otherwise falls back to shutil.copyfile, which
+    uses os.sendfile on Linux so the bytes never pass through user space.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 def process_multiple_images(files, use_gpu, with_scratch, high_resolution):
     """
@@ -371,8 +622,9 @@ def process_multiple_images(files, use_gpu, with_scratch, high_resolution):
     
     results = []
     
-    # Create temporary directories
-    with tempfile.TemporaryDirectory() as temp_dir:
+    # Create temporary directories inside the shared scratch space
+    temp_dir = new_scratch_dir()
+    try:
         input_dir = os.path.join(temp_dir, "input")
         output_dir = os.path.join(temp_dir, "output")
         
@@ -385,7 +637,7 @@ def process_multiple_images(files, use_gpu, with_scratch, high_resolution):
                 ext = Path(file_path).suffix
                 new_name = f"image_{i}{ext}"
                 new_path = os.path.join(input_dir, new_name)
-                shutil.copy2(file_path, new_path)
+                _stage(file_path, new_path)
         
         # Set GPU ID
         gpu_id = 0 if use_gpu else -1
@@ -407,23 +659,131 @@ def process_multiple_images(files, use_gpu, with_scratch, high_resolution):
         # Load results
         final_output_dir = os.path.join(output_dir, "final_output")
         if os.path.exists(final_output_dir):
-            for i, file_path in enumerate(files):
-                if file_path is not None:
-                    original_image = Image.open(file_path)
-                    ext = Path(file_path).suffix
-                    restored_name = f"image_{i}{ext}"
-                    restored_path = os.path.join(final_output_dir, restored_name)
-                    
-                    if os.path.exists(restored_path):
-                        restored_image = Image.open(restored_path)
-                        comparison = make_grid(original_image, restored_image)
-                        results.append((original_image, restored_image, comparison))
-                    else:
-                        results.append((original_image, None, None))
-                else:
-                    results.append((None, None, None))
+            def load_result(indexed_file):
+                i, file_path = indexed_file
+                if file_path is None:
+                    return (None, None, None)
+                
+                original_image = Image.open(file_path)
+                original_image.load()
+                ext = Path(file_path).suffix
+                restored_name = f"image_{i}{ext}"
+                restored_path = os.path.join(final_output_dir, restored_name)
+                
+                if os.path.exists(restored_path):
+                    restored_image = Image.open(restored_path)
+                    restored_image.load()
+                    comparison = make_grid(original_image, restored_image)
+                    return (original_image, restored_image, comparison)
+                return (original_image, None, None)
+            
+            # PIL releases the GIL while decoding, so the images load in
+            # parallel; map() keeps the results in upload order
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+                results = list(executor.map(load_result, enumerate(files)))
         
         return results
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _rgb_contrast(a):
+        """Std-dev of the channel-mean gray image in one pass over (H, W, C) uint8"""
+        n = a.shape[0] * a.shape[1]
+        channels = a.shape[2]
+        s = 0.0
+        s2 = 0.0
+        for i in prange(a.shape[0]):
+            for j in range(a.shape[1]):
+                g = 0.0
+                for c in range(channels):
+                    g += a[i, j, c]
+                g /= channels
+                s += g
+                s2 += g * g
+        mean = s / n
+        return math.sqrt(max(s2 / n - mean * mean, 0.0))
+else:
+    _rgb_contrast = None
+
+def image_contrast(img_array):
+    """Contrast (std-dev of the gray levels) of an image array"""
+    if img_array.ndim == 3:
+        # Color image
+        if _rgb_contrast is not None and img_array.dtype == np.uint8:
+            return _rgb_contrast(img_array)
+        # float32 halves the bytes of the gray temporary vs. the float64 default
+        gray = img_array.mean(axis=2, dtype=np.float32)
+    else:
+        # Grayscale
+        gray = img_array
+    return float(gray.std(dtype=np.float32))
+
+def test_face_detection(image):
+    """Test if face detection works on the uploaded image"""
+    if image is None:
+        return "No image uploaded"
+    
+    try:
+        # Try to import face detection
+        import sys
+        sys.path.append("photo_restoration/Face_Detection")
+        
+        # This is a simplified test - in practice, the actual face detection
+        # happens inside the restoration pipeline
+        report = f"## Face Detection Test\n\n"
+        report += f"**Image Info:**\n"
+        report += f"- Size: {image.size}\n"
+        report += f"- Mode: {image.mode}\n"
+        report += f"- Format: {image.format}\n\n"
+        
+        # Basic image quality checks
+        width, height = image.size
+        if width < 100 or height < 100:
+            report += "⚠️ **Warning:** Image is very small. Face detection may fail.\n\n"
+        
+        if width > 2000 or height > 2000:
+            report += "⚠️ **Warning:** Image is very large. Processing may be slow.\n\n"
+        
+        # Check if image has reasonable contrast; palette and other modes
+        # are converted first, then the pixels are viewed without a copy
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # Contrast is a global statistic, so a 512px thumbnail is plenty
+        if width * height > 512 * 512:
+            image = image.copy()
+            image.thumbnail((512, 512), Image.BILINEAR)
+        img_array = np.asarray(image)
+        contrast = image_contrast(img_array)
+        if contrast < 20:
+            report += "⚠️ **Warning:** Image has low contrast. Face detection may fail.\n\n"
+        
+        report += "**Recommendations:**\n"
+        report += "- Ensure the image contains a clear, front-facing face\n"
+        report += "- Face should be reasonably sized (not too small)\n"
+        report += "- Image should have good lighting and contrast\n"
+        report += "- Avoid extreme angles or heavily obscured faces\n\n"
+        
+        report += "**Note:** This is a basic check. The actual face detection happens during restoration.\n"
+        
+        return report
+        
+    except Exception as e:
+        return f"Error testing face detection: {str(e)}"
+
+def compare_images(original, restored, slider_value):
+    """
+    Function to show either original or restored image based on slider
+    """
+    if original is None or restored is None:
+        return None
+    
+    # Convert slider value (0-100) to choose between original and restored
+    if slider_value < 50:
+        return original
+    else:
+        return restored
 
 def create_gradio_interface():
     """Create the Gradio interface"""
@@ -492,7 +852,9 @@ def create_gradio_interface():
                     gr.Markdown("### Upload Your Photo")
                     input_image = gr.Image(
                         label="Upload Image",
-                        type="pil",
+                        # The file itself, so its format is known and PNG or
+                        # JPEG uploads can be restored without re-encoding
+                        type="filepath",
                         height=400
                     )
             
@@ -519,7 +881,10 @@ def create_gradio_interface():
             process_btn.click(
                 fn=process_single_image,
                 inputs=[input_image, use_gpu, with_scratch, high_resolution],
-                outputs=[original_output, restored_output, download_file]
+                outputs=[original_output, restored_output, download_file],
+                # Requests must be able to overlap for restore_in_batch to
+                # group them; Gradio 4+ runs one event at a time by default
+                concurrency_limit=None
             )
             
             # Update download status when file is available
@@ -661,6 +1026,14 @@ def create_gradio_interface():
 
 def main():
     """Main function to run the Gradio app"""
+    # Per-request details, including the stage directory listings, are
+    # logged at DEBUG; keep the console quiet unless PHOTO_RESTORE_DEBUG is set
+    # Only this module's logger goes to DEBUG, so PIL, gradio, httpx etc.
+    # stay at WARNING
+    logging.basicConfig(level=logging.WARNING)
+    if os.environ.get("PHOTO_RESTORE_DEBUG"):
+        log.setLevel(logging.DEBUG)
+    
     print("Starting Photo Restoration Gradio App...")
     
     # Check if photo_restoration directory exists
@@ -669,6 +1042,11 @@ def main():
         print("Please run setup_environment.py first to set up the environment.")
         return
     
+    # Compile the contrast kernel now so the first face detection test
+    # doesn't pay the JIT cost
+    if _rgb_contrast is not None:
+        _rgb_contrast(np.zeros((4, 4, 3), dtype=np.uint8))
+    
     # Create and launch the app
     app = create_gradio_interface()
     
@@ -681,70 +1059,5 @@ def main():
         show_error=True
     )
 
-def test_face_detection(image):
-    """Test if face detection works on the uploaded image"""
-    if image is None:
-        return "No image uploaded"
-    
-    try:
-        # Try to import face detection
-        import sys
-        sys.path.append("photo_restoration/Face_Detection")
-        
-        # This is a simplified test - in practice, the actual face detection
-        # happens inside the restoration pipeline
-        report = f"## Face Detection Test\n\n"
-        report += f"**Image Info:**\n"
-        report += f"- Size: {image.size}\n"
-        report += f"- Mode: {image.mode}\n"
-        report += f"- Format: {image.format}\n\n"
-        
-        # Basic image quality checks
-        width, height = image.size
-        if width < 100 or height < 100:
-            report += "⚠️ **Warning:** Image is very small. Face detection may fail.\n\n"
-        
-        if width > 2000 or height > 2000:
-            report += "⚠️ **Warning:** Image is very large. Processing may be slow.\n\n"
-        
-        # Check if image has reasonable contrast
-        img_array = np.array(image)
-        if len(img_array.shape) == 3:
-            # Color image
-            gray = np.mean(img_array, axis=2)
-        else:
-            # Grayscale
-            gray = img_array
-        
-        contrast = np.std(gray)
-        if contrast < 20:
-            report += "⚠️ **Warning:** Image has low contrast. Face detection may fail.\n\n"
-        
-        report += "**Recommendations:**\n"
-        report += "- Ensure the image contains a clear, front-facing face\n"
-        report += "- Face should be reasonably sized (not too small)\n"
-        report += "- Image should have good lighting and contrast\n"
-        report += "- Avoid extreme angles or heavily obscured faces\n\n"
-        
-        report += "**Note:** This is a basic check. The actual face detection happens during restoration.\n"
-        
-        return report
-        
-    except Exception as e:
-        return f"Error testing face detection: {str(e)}"
-
-def compare_images(original, restored, slider_value):
-    """
-    Function to show either original or restored image based on slider
-    """
-    if original is None or restored is None:
-        return None
-    
-    # Convert slider value (0-100) to choose between original and restored
-    if slider_value < 50:
-        return original
-    else:
-        return restored
-
 if __name__ == "__main__":
     main() 
\ No newline at end of file
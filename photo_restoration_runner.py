@@ -11,49 +11,97 @@ import sys
 import subprocess
 import shutil
 import io
-import numpy as np
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import PIL.Image
 from pathlib import Path
 
-def run_command(command, cwd=None, check=True):
+try:
+    import psutil
+except ImportError:
+    # psutil is optional; without it the thread count falls back to the
+    # CPUs this process may run on
+    psutil = None
+
+def run_command(command, cwd=None, check=True, env=None):
     """Run a shell command and return the result"""
-    print(f"Running: {command}")
-    result = subprocess.run(command, shell=True, cwd=cwd, capture_output=True, text=True)
+    # Argument lists are started directly, without an intermediate shell
+    use_shell = isinstance(command, str)
+    display = command if use_shell else subprocess.list2cmdline(command)
+    print(f"Running: {display}")
+    result = subprocess.run(command, shell=use_shell, cwd=cwd, env=env, capture_output=True, text=True)
     if check and result.returncode != 0:
-        print(f"Error running command: {command}")
+        print(f"Error running command: {display}")
         print(f"Error: {result.stderr}")
         return False
     return True
 
+def grid_half_size(size, W_base=600):
+    """Size of each half of a resized make_grid comparison for an input of size"""
+    W, H = size
+    ratio = W_base / (W*2)
+    return W_base // 2, int(H * ratio)
+
 def make_grid(I1, I2, resize=True):
     """Create a side-by-side comparison grid of two images"""
-    I1 = np.asarray(I1)
-    H, W = I1.shape[0], I1.shape[1]
-
-    if I1.ndim >= 3:
-        I2 = np.asarray(I2.resize((W,H)))
-        I_combine = np.zeros((H,W*2,3))
-        I_combine[:,:W,:] = I1[:,:,:3]
-        I_combine[:,W:,:] = I2[:,:,:3]
-    else:
-        I2 = np.asarray(I2.resize((W,H)).convert('L'))
-        I_combine = np.zeros((H,W*2))
-        I_combine[:,:W] = I1[:,:]
-        I_combine[:,W:] = I2[:,:]
-    I_combine = PIL.Image.fromarray(np.uint8(I_combine))
+    W, H = I1.size
+    resample = PIL.Image.BICUBIC
+    # Single-band inputs give a grayscale grid, everything else RGB
+    mode = 'L' if len(I1.getbands()) == 1 else 'RGB'
 
-    W_base = 600
     if resize:
-      ratio = W_base / (W*2)
-      H_new = int(H * ratio)
-      I_combine = I_combine.resize((W_base, H_new), PIL.Image.LANCZOS)
+      # Shrink each half straight to its final size, so the concatenation
+      # only ever touches display-sized pixels
+      W, H = grid_half_size(I1.size)
+      resample = PIL.Image.LANCZOS
+
+    # Paste both halves into one image, staying in PIL's C code throughout
+    I_combine = PIL.Image.new(mode, (W*2, H))
+    for I, x in ((I1, 0), (I2, W)):
+        # Convert first so palette and alpha images resize like plain ones
+        if I.mode != mode:
+            I = I.convert(mode)
+        # Restored images usually come back at the input's size already
+        if I.size != (W, H):
+            I = I.resize((W, H), resample)
+        I_combine.paste(I, (x, 0))
 
     return I_combine
 
+def _cpu_thread_env():
+    """Environment for a CPU restoration with one math thread per core"""
+    if psutil is not None:
+        cores = psutil.cpu_count(logical=False)
+    elif hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count()
+    env = os.environ.copy()
+    if cores:
+        # Settings the user exported themselves take precedence
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            env.setdefault(var, str(cores))
+    env.setdefault("KMP_AFFINITY", "granularity=fine,compact,1,0")
+    return env
+
+# Folders run.py writes its results into, relative to its output folder
+STAGE_DIRS = ("stage_1_restore_output", "stage_2_detection_output", "stage_3_face_output", "final_output")
+
+def _clear_stage_outputs(output_folder):
+    """Remove the stage and final result folders left by an earlier run
+    
+    run.py can exit 0 even when a stage fails, so any result left behind
+    could be mistaken for one from this run. Everything else in
+    output_folder is kept.
+    """
+    for stage in STAGE_DIRS:
+        shutil.rmtree(os.path.join(output_folder, stage), ignore_errors=True)
+
 def restore_photos(input_folder, output_folder, gpu_id=-1, with_scratch=False, hr=False):
     """
     Restore photos using the Bringing Old Photos Back to Life model
-    
+
     Args:
         input_folder: Path to folder containing input images
         output_folder: Path to folder where restored images will be saved
@@ -61,88 +109,129 @@ def restore_photos(input_folder, output_folder, gpu_id=-1, with_scratch=False, h
         with_scratch: Whether to use scratch removal mode
         hr: Whether to use high resolution mode
     """
-    
+
     # Check if photo_restoration directory exists
     photo_restoration_dir = "photo_restoration"
     if not os.path.exists(photo_restoration_dir):
         print(f"Error: {photo_restoration_dir} directory not found.")
         print("Please run setup_environment.py first to set up the environment.")
         return False
-    
+
     # Check if run.py exists in photo_restoration directory
     run_py_path = os.path.join(photo_restoration_dir, "run.py")
     if not os.path.exists(run_py_path):
         print(f"Error: run.py not found in {photo_restoration_dir} directory.")
         return False
-    
-    # Create output directory if it doesn't exist
-    if os.path.isdir(output_folder):
-        shutil.rmtree(output_folder)
-    os.makedirs(output_folder)
-    
-    # Build the command - run from photo_restoration directory
-    cmd = f"python run.py --input_folder {input_folder} --output_folder {output_folder} --GPU {gpu_id}"
-    
+
+    # Create output directory if it doesn't exist; an existing one is reused,
+    # but the results of any earlier run are cleared out
+    os.makedirs(output_folder, exist_ok=True)
+    _clear_stage_outputs(output_folder)
+
+    # Build the command - run from photo_restoration directory, with the
+    # interpreter that is already running (and has its environment set up)
+    cmd = [sys.executable, "run.py", "--input_folder", str(input_folder),
+           "--output_folder", str(output_folder), "--GPU", str(gpu_id)]
+
     if with_scratch:
-        cmd += " --with_scratch"
-    
+        cmd.append("--with_scratch")
+
     if hr:
-        cmd += " --HR"
-    
-    print(f"Running photo restoration with command: {cmd}")
+        cmd.append("--HR")
+
+    print(f"Running photo restoration with command: {subprocess.list2cmdline(cmd)}")
     print(f"Working directory: {photo_restoration_dir}")
-    
+
+    # On CPU, size PyTorch's OpenMP/BLAS thread pools to the machine
+    env = _cpu_thread_env() if gpu_id == -1 else None
+
     # Run the restoration from the photo_restoration directory
-    success = run_command(cmd, cwd=photo_restoration_dir)
-    
+    success = run_command(cmd, cwd=photo_restoration_dir, env=env)
+
     if success:
         print(f"Photo restoration completed successfully!")
         print(f"Results saved to: {output_folder}")
     else:
         print("Photo restoration failed!")
-    
+
     return success
 
 def visualize_results(input_folder, output_folder):
     """Display before/after comparisons of restored photos"""
     input_path = Path(input_folder)
     output_path = Path(output_folder) / "final_output"
-    
+
     if not output_path.exists():
         print(f"Output folder {output_path} does not exist!")
         return
-    
+
     # Get all image files
     image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
     filenames = [f for f in input_path.iterdir() 
                 if f.is_file() and f.suffix.lower() in image_extensions]
     filenames.sort()
-    
+
     print(f"Found {len(filenames)} images to process")
-    
-    for filename in filenames:
-        print(f"Processing: {filename.name}")
-        
-        # Load original and restored images
-        try:
-            image_original = PIL.Image.open(filename)
-            image_restore = PIL.Image.open(output_path / filename.name)
+
+    # A single image is not worth starting worker processes for
+    if len(filenames) <= 1:
+        for filename in filenames:
+            print(_process_one(filename, output_path))
+        return
+
+    # Each comparison is independent decode/resize/encode work, so fan the
+    # images out over up to one process per core
+    workers = min(len(filenames), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for message in executor.map(_process_one, filenames, repeat(output_path), chunksize=4):
+            print(message)
+
+def _map_file(path):
+    """Memory-map a file read-only, for use as a seekable file object"""
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _process_one(filename, output_path):
+    """Build and save the comparison grid for a single image"""
+    restore_path = output_path / filename.name
+    comparison_path = output_path / f"comparison_{filename.name}"
+
+    # Load original and restored images
+    try:
+        # A comparison newer than both of its sources is still current, so
+        # repeated calls skip decoding the pair again
+        if comparison_path.exists():
+            newest_source = max(filename.stat().st_mtime_ns, restore_path.stat().st_mtime_ns)
+            if comparison_path.stat().st_mtime_ns >= newest_source:
+                return f"Comparison for {filename.name} is up to date: {comparison_path}"
+
+        # Decode straight from read-only mappings of both files; make_grid
+        # finishes reading them before the mappings are closed
+        with _map_file(filename) as original_map, \
+             _map_file(restore_path) as restore_map:
+            image_original = PIL.Image.open(original_map)
+            image_restore = PIL.Image.open(restore_map)
+            # These images are only used for the grid, so for JPEGs let the
+            # decoder scale down by 1/2-1/8 while decoding; pixels the
+            # resize would throw away are never produced
+            half_size = grid_half_size(image_original.size)
+            image_original.draft(image_original.mode, half_size)
+            image_restore.draft(image_restore.mode, half_size)
             
             # Create comparison grid
             comparison = make_grid(image_original, image_restore)
-            
-            # Save comparison
-            comparison_path = output_path / f"comparison_{filename.name}"
-            comparison.save(comparison_path)
-            print(f"Comparison saved to: {comparison_path}")
-            
-        except Exception as e:
-            print(f"Error processing {filename.name}: {e}")
+        
+        # Save comparison
+        comparison.save(comparison_path)
+        return f"Processed {filename.name}, comparison saved to: {comparison_path}"
+        
+    except Exception as e:
+        return f"Error processing {filename.name}: {e}"
 
 def process_custom_photos(input_folder, output_folder, gpu_id=-1, with_scratch=True, hr=True):
     """
     Process custom photos uploaded by the user
-    
+
     Args:
         input_folder: Path to folder containing user's photos
         output_folder: Path to folder where results will be saved
@@ -150,17 +239,17 @@ def process_custom_photos(input_folder, output_folder, gpu_id=-1, with_scratch=T
         with_scratch: Whether to use scratch removal mode
         hr: Whether to use high resolution mode
     """
-    
+
     # Create directories
     os.makedirs(input_folder, exist_ok=True)
     os.makedirs(output_folder, exist_ok=True)
-    
+
     print(f"Processing photos from: {input_folder}")
     print(f"Results will be saved to: {output_folder}")
-    
+
     # Run restoration
     success = restore_photos(input_folder, output_folder, gpu_id, with_scratch, hr)
-    
+
     if success:
         # Visualize results
         visualize_results(input_folder, output_folder)
@@ -174,27 +263,27 @@ def main():
     """Main function to demonstrate usage"""
     print("Bringing Old Photos Back to Life - Standalone Runner")
     print("=" * 50)
-    
+
     # Check if photo_restoration directory exists
     if not os.path.exists("photo_restoration"):
         print("Error: photo_restoration directory not found!")
         print("Please run setup_environment.py first to set up the environment.")
         return
-    
+
     # Check if run.py exists
     if not os.path.exists("photo_restoration/run.py"):
         print("Error: run.py not found in photo_restoration directory!")
         print("Please run setup_environment.py first to set up the environment.")
         return
-    
+
     # Example usage
     print("\nExample 1: Restore photos (normal mode)")
     print("-" * 40)
-    
+
     # Check if test images exist
     test_input = "test_images/old"
     test_output = "output"
-    
+
     if os.path.exists(test_input):
         print(f"Found test images in {test_input}")
         restore_photos(test_input, test_output, gpu_id=-1)  # Use CPU
@@ -202,10 +291,10 @@ def main():
     else:
         print(f"Test images not found in {test_input}")
         print("You can place your own images in a folder and specify the path.")
-    
+
     print("\nExample 2: Restore photos with scratch removal")
     print("-" * 40)
-    
+
     test_input_scratch = "test_images/old_w_scratch"
     if os.path.exists(test_input_scratch):
         print(f"Found test images with scratches in {test_input_scratch}")
@@ -213,7 +302,7 @@ def main():
         visualize_results(test_input_scratch, test_output)
     else:
         print(f"Test images with scratches not found in {test_input_scratch}")
-    
+
     print("\nTo process your own photos:")
     print("1. Create a folder with your old photos")
     print("2. Call: process_custom_photos('your_input_folder', 'your_output_folder')")
@@ -17,9 +17,13 @@ def main():
         print("Please run setup_environment.py first to set up the environment.")
         return
     
-    # Get input and output folders from user
-    input_folder = input("Enter the path to your input photos folder: ").strip()
-    output_folder = input("Enter the path for output results: ").strip()
+    # Get input and output folders from the command line or the user.
+    # The whole input folder is restored in a single run.
+    if len(sys.argv) >= 3:
+        input_folder, output_folder = sys.argv[1], sys.argv[2]
+    else:
+        input_folder = input("Enter the path to your input photos folder: ").strip()
+        output_folder = input("Enter the path for output results: ").strip()
     
     # Validate input folder
     if not os.path.exists(input_folder):
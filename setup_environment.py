@@ -11,13 +11,23 @@ This script will:
 
 import os
 import sys
+import json
+import re
 import subprocess
 import shutil
 import urllib.request
 import zipfile
 import bz2
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Block size used when streaming archive contents to disk
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Extracted checkpoints are kept here as .tar.zst so a re-setup can skip the
+# download and the (much slower) DEFLATE decompression
+CHECKPOINT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "photo_restoration")
+
 def run_command(command, cwd=None, check=True):
     """Run a shell command and return the result"""
     print(f"Running: {command}")
@@ -32,58 +42,142 @@ def download_file(url, filename):
     """Download a file from URL"""
     print(f"Downloading {filename} from {url}")
     try:
-        urllib.request.urlretrieve(url, filename)
+        # Stream the response to disk in large chunks
+        with urllib.request.urlopen(url) as response, open(filename, 'wb') as target:
+            shutil.copyfileobj(response, target, 1024 * 1024)
         print(f"Successfully downloaded {filename}")
     except Exception as e:
         print(f"Error downloading {filename}: {e}")
         return False
     return True
 
+def download_and_extract(url, archive_path, extract, extract_to):
+    """Download an archive, extract it and remove the archive"""
+    if download_file(url, archive_path):
+        extract(archive_path, extract_to)
+        os.remove(archive_path)
+
+def download_bz2(url, extract_to):
+    """Download a bz2 file, decompressing it while it streams in"""
+    print(f"Downloading and extracting {url} to {extract_to}")
+    partial = extract_to + ".part"
+    try:
+        decompressor = bz2.BZ2Decompressor()
+        with urllib.request.urlopen(url) as response, open(partial, 'wb') as target:
+            while True:
+                chunk = response.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                target.write(decompressor.decompress(chunk))
+        if not decompressor.eof:
+            raise EOFError("Compressed stream ended before the end-of-stream marker")
+        os.replace(partial, extract_to)
+        print(f"Successfully extracted {extract_to}")
+    except Exception as e:
+        print(f"Error downloading {url}: {e}")
+        if os.path.exists(partial):
+            os.remove(partial)
+        return False
+    return True
+
 def extract_zip(zip_path, extract_to):
     """Extract a zip file"""
     print(f"Extracting {zip_path} to {extract_to}")
     try:
+        root = os.path.realpath(extract_to)
+        members = set()
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
+            for info in zip_ref.infolist():
+                members.add(info.filename.split('/')[0])
+                target = os.path.realpath(os.path.join(root, info.filename))
+                if os.path.commonpath([root, target]) != root:
+                    raise ValueError(f"Unsafe path in archive: {info.filename}")
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # Inflate in large blocks into a temporary file next to the
+                # target, then move it into place
+                partial = target + ".part"
+                with zip_ref.open(info, 'r') as source, open(partial, 'wb') as dest:
+                    shutil.copyfileobj(source, dest, COPY_BUFFER_SIZE)
+                os.replace(partial, target)
         print(f"Successfully extracted {zip_path}")
+        save_checkpoint_cache(zip_path, extract_to, members)
     except Exception as e:
         print(f"Error extracting {zip_path}: {e}")
         return False
     return True
 
-def extract_bz2(bz2_path, extract_to):
-    """Extract a bz2 file"""
-    print(f"Extracting {bz2_path} to {extract_to}")
-    try:
-        with bz2.open(bz2_path, 'rb') as source, open(extract_to, 'wb') as target:
-            shutil.copyfileobj(source, target)
-        print(f"Successfully extracted {bz2_path}")
-    except Exception as e:
-        print(f"Error extracting {bz2_path}: {e}")
+def checkpoint_cache_path(zip_path):
+    """Return the .tar.zst cache location for a checkpoint zip"""
+    name = os.path.splitext(os.path.basename(zip_path))[0]
+    return os.path.join(CHECKPOINT_CACHE_DIR, f"{name}.tar.zst")
+
+def run_tar_zstd(args):
+    """Run tar with zstd compression on all cores, returning True on success"""
+    if not (shutil.which("tar") and shutil.which("zstd")):
         return False
+    env = dict(os.environ, ZSTD_NBTHREADS="0")
+    result = subprocess.run(["tar", "--zstd", *args], env=env, capture_output=True, text=True)
+    return result.returncode == 0
+
+def save_checkpoint_cache(zip_path, extract_to, members):
+    """Store the extracted top-level members of a zip in the checkpoint cache"""
+    cache_path = checkpoint_cache_path(zip_path)
+    os.makedirs(CHECKPOINT_CACHE_DIR, exist_ok=True)
+    partial = cache_path + ".part"
+    if run_tar_zstd(["-cf", partial, "-C", extract_to, *sorted(members)]):
+        os.replace(partial, cache_path)
+        print(f"Cached extracted files in {cache_path}")
+    elif os.path.exists(partial):
+        os.remove(partial)
+
+def restore_checkpoint_cache(zip_path, extract_to):
+    """Extract a cached copy of a checkpoint zip, returning True on success"""
+    cache_path = checkpoint_cache_path(zip_path)
+    if not os.path.exists(cache_path):
+        return False
+    print(f"Restoring {os.path.basename(zip_path)} contents from {cache_path}")
+    return run_tar_zstd(["-xf", cache_path, "-C", extract_to])
+
+def copy_sync_batchnorm(networks_dir):
+    """Copy sync_batchnorm out of the Synchronized-BatchNorm clone in networks_dir"""
+    src = os.path.join(networks_dir, "Synchronized-BatchNorm-PyTorch", "sync_batchnorm")
+    if not os.path.isdir(src):
+        # The clone failed; report it and let the rest of the setup continue
+        print(f"Error copying {src}")
+        print(f"Error: {src} not found, the Synchronized-BatchNorm-PyTorch clone may have failed")
+        return False
+    shutil.copytree(src, os.path.join(networks_dir, "sync_batchnorm"), dirs_exist_ok=True)
     return True
 
-def check_package_installed(pip_path, package_name):
-    """Check if a package is already installed"""
+def installed_packages(pip_path):
+    """Return the normalized names of all packages installed in the venv"""
+    result = subprocess.run([pip_path, "list", "--format=json"],
+                            capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        return set()
     try:
-        result = subprocess.run([pip_path, "show", package_name], 
-                              capture_output=True, text=True, check=False)
-        return result.returncode == 0
-    except:
-        return False
+        return {normalize_package_name(pkg["name"]) for pkg in json.loads(result.stdout)}
+    except (ValueError, KeyError, TypeError):
+        return set()
 
-def install_package_if_needed(pip_path, package_name, install_cmd=None):
-    """Install a package only if it's not already installed"""
-    if check_package_installed(pip_path, package_name):
-        print(f"Package {package_name} already installed, skipping.")
+def normalize_package_name(name):
+    """Normalize a package name the way pip compares them"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def install_missing_packages(pip_path, packages, installed, extra_args=""):
+    """Install the packages that are not installed yet with one pip call"""
+    missing = [pkg for pkg in packages if normalize_package_name(pkg) not in installed]
+    for pkg in packages:
+        if pkg not in missing:
+            print(f"Package {pkg} already installed, skipping.")
+    if not missing:
         return True
-    
-    if install_cmd:
-        print(f"Installing {package_name}...")
-        return run_command(install_cmd, check=False)
-    else:
-        print(f"Installing {package_name}...")
-        return run_command(f"{pip_path} install {package_name}", check=False)
+    print(f"Installing {', '.join(missing)}...")
+    return run_command(f"{pip_path} install --prefer-binary {' '.join(missing)} {extra_args}".rstrip(),
+                       check=False)
 
 def main():
     print("Setting up Bringing Old Photos Back to Life environment...")
@@ -107,17 +201,15 @@ def main():
     print("Checking and installing base requirements...")
     run_command(f"{pip_path} install --upgrade pip")
     
-    # Install packages only if not already installed
-    install_package_if_needed(pip_path, "torch", f"{pip_path} install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cpu")
-    install_package_if_needed(pip_path, "opencv-python", f"{pip_path} install opencv-python")
-    install_package_if_needed(pip_path, "pillow", f"{pip_path} install pillow")
-    install_package_if_needed(pip_path, "numpy", f"{pip_path} install numpy")
-    install_package_if_needed(pip_path, "scipy", f"{pip_path} install scipy")
-    install_package_if_needed(pip_path, "matplotlib", f"{pip_path} install matplotlib")
-    install_package_if_needed(pip_path, "dlib", f"{pip_path} install dlib")
-    install_package_if_needed(pip_path, "requests", f"{pip_path} install requests")
-    install_package_if_needed(pip_path, "tqdm", f"{pip_path} install tqdm")
-    install_package_if_needed(pip_path, "gradio", f"{pip_path} install gradio")
+    # Install packages only if not already installed, diffing against a
+    # single pip list and installing what is missing in as few pip runs as
+    # possible (torch comes from its own CPU wheel index)
+    os.environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+    installed = installed_packages(pip_path)
+    install_missing_packages(pip_path, ["torch", "torchvision", "torchaudio"], installed,
+                             "--index-url https://download.pytorch.org/whl/cpu")
+    install_missing_packages(pip_path, ["opencv-python", "pillow", "numpy", "scipy", "matplotlib",
+                                        "dlib", "requests", "tqdm", "gradio"], installed)
     
     # Clone the main repository
     if not os.path.exists("photo_restoration"):
@@ -142,9 +234,8 @@ def main():
         if not os.path.exists(face_enhancement_networks):
             os.makedirs(face_enhancement_networks, exist_ok=True)
         run_command("git clone https://github.com/vacancy/Synchronized-BatchNorm-PyTorch", 
-                   cwd=face_enhancement_networks)
-        run_command("cp -rf Synchronized-BatchNorm-PyTorch/sync_batchnorm .", 
-                   cwd=face_enhancement_networks)
+                   cwd=face_enhancement_networks, check=False)
+        copy_sync_batchnorm(face_enhancement_networks)
     else:
         print("Synchronized-BatchNorm for Face Enhancement already exists, skipping setup.")
     
@@ -156,12 +247,14 @@ def main():
         if not os.path.exists(global_networks):
             os.makedirs(global_networks, exist_ok=True)
         run_command("git clone https://github.com/vacancy/Synchronized-BatchNorm-PyTorch", 
-                   cwd=global_networks)
-        run_command("cp -rf Synchronized-BatchNorm-PyTorch/sync_batchnorm .", 
-                   cwd=global_networks)
+                   cwd=global_networks, check=False)
+        copy_sync_batchnorm(global_networks)
     else:
         print("Synchronized-BatchNorm for Global already exists, skipping setup.")
     
+    # Model downloads that still need to happen, as (function, args) pairs
+    downloads = []
+    
     # Download face landmark detection model
     face_detection_dir = "Face_Detection"
     landmark_file = os.path.join(face_detection_dir, "shape_predictor_68_face_landmarks.dat")
@@ -169,10 +262,8 @@ def main():
         print("Downloading face landmark detection model...")
         if not os.path.exists(face_detection_dir):
             os.makedirs(face_detection_dir, exist_ok=True)
-        bz2_file = os.path.join(face_detection_dir, "shape_predictor_68_face_landmarks.dat.bz2")
-        if download_file("http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2", bz2_file):
-            extract_bz2(bz2_file, landmark_file)
-            os.remove(bz2_file)
+        downloads.append((download_bz2, ("http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2",
+                                         landmark_file)))
     else:
         print("Face landmark detection model already exists, skipping download.")
     
@@ -186,10 +277,9 @@ def main():
         print("Downloading face enhancement checkpoints...")
         if not os.path.exists(face_enhancement_dir):
             os.makedirs(face_enhancement_dir, exist_ok=True)
-        if download_file("https://github.com/microsoft/Bringing-Old-Photos-Back-to-Life/releases/download/v1.0/face_checkpoints.zip", 
-                         face_checkpoints_zip):
-            extract_zip(face_checkpoints_zip, face_enhancement_dir)
-            os.remove(face_checkpoints_zip)
+        if not restore_checkpoint_cache(face_checkpoints_zip, face_enhancement_dir):
+            downloads.append((download_and_extract, ("https://github.com/microsoft/Bringing-Old-Photos-Back-to-Life/releases/download/v1.0/face_checkpoints.zip",
+                                                     face_checkpoints_zip, extract_zip, face_enhancement_dir)))
     else:
         print("Face enhancement checkpoints already exist, skipping download.")
     
@@ -203,13 +293,19 @@ def main():
         print("Downloading global checkpoints...")
         if not os.path.exists(global_dir):
             os.makedirs(global_dir, exist_ok=True)
-        if download_file("https://github.com/microsoft/Bringing-Old-Photos-Back-to-Life/releases/download/v1.0/global_checkpoints.zip", 
-                         global_checkpoints_zip):
-            extract_zip(global_checkpoints_zip, global_dir)
-            os.remove(global_checkpoints_zip)
+        if not restore_checkpoint_cache(global_checkpoints_zip, global_dir):
+            downloads.append((download_and_extract, ("https://github.com/microsoft/Bringing-Old-Photos-Back-to-Life/releases/download/v1.0/global_checkpoints.zip",
+                                                     global_checkpoints_zip, extract_zip, global_dir)))
     else:
         print("Global checkpoints already exist, skipping download.")
     
+    # The downloads are independent, so fetch and unpack them concurrently
+    if downloads:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(function, *args) for function, args in downloads]
+            for future in futures:
+                future.result()
+    
     print("\nSetup completed successfully!")
     print(f"\nTo activate the virtual environment:")
     if sys.platform == "win32":
@@ -4,38 +4,62 @@ Test script to verify photo restoration is working correctly
 """
 
 import os
+import stat
 import tempfile
-import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 from PIL import Image
 import numpy as np
-from photo_restoration_runner import restore_photos, make_grid
+
+# Shared generator for the test image, seeded so runs are reproducible
+_rng = np.random.default_rng(0)
 
 def create_test_image():
-    """Create a test image that looks more like an old photo"""
-    # Create a more realistic test image
-    img_array = np.random.randint(100, 200, (512, 512, 3), dtype=np.uint8)
+    """Create a test image that looks more like an old photo, as an RGB uint8 array"""
+    # Create a more realistic test image, drawn as int16 so it feeds the
+    # integer sepia product below without a separate cast
+    img_array = _rng.integers(100, 200, (512, 512, 3), dtype=np.int16)
     
     # Add some "old photo" characteristics
-    # Add sepia tone
-    img_array = img_array.astype(np.float32)
-    img_array[:, :, 0] = img_array[:, :, 0] * 0.393 + img_array[:, :, 1] * 0.769 + img_array[:, :, 2] * 0.189
-    img_array[:, :, 1] = img_array[:, :, 0] * 0.349 + img_array[:, :, 1] * 0.686 + img_array[:, :, 2] * 0.168
-    img_array[:, :, 2] = img_array[:, :, 0] * 0.272 + img_array[:, :, 1] * 0.534 + img_array[:, :, 2] * 0.131
+    # Add sepia tone, mixing all three channels in one matrix product so each
+    # output channel is computed from the original RGB values; the matrix is
+    # in 10-bit fixed point so the math stays in int32
+    sepia = np.array([[0.393, 0.769, 0.189],
+                      [0.349, 0.686, 0.168],
+                      [0.272, 0.534, 0.131]])
+    # Scaling by the largest row sum (rounding down) keeps every output at or
+    # below its brightest input, so no clipping is needed
+    sepia = np.floor(sepia / sepia.sum(axis=1).max() * 1024).astype(np.int32)
+    toned = img_array.reshape(-1, 3) @ sepia.T
+    toned >>= 10
+    img_array = toned.astype(np.uint8, copy=False).reshape(img_array.shape)
     
     # Add some "damage" - scratches and spots
-    for i in range(20):
-        x = np.random.randint(0, 512)
-        y = np.random.randint(0, 512)
-        # Add dark spots
-        img_array[y:y+3, x:x+3] = [30, 30, 30]
-    
-    # Add some horizontal scratches
-    for i in range(5):
-        y = np.random.randint(0, 512)
-        img_array[y:y+2, :] = [20, 20, 20]
-    
-    img_array = np.clip(img_array, 0, 255).astype(np.uint8)
-    return Image.fromarray(img_array)
+    # Add dark 3x3 spots, indexing all 20 of them at once
+    ys, xs = _rng.integers(0, 510, size=(20, 2)).T
+    offsets = np.arange(3)
+    img_array[ys[:, None, None] + offsets[None, :, None],
+              xs[:, None, None] + offsets[None, None, :]] = 30
+    
+    # Add some horizontal scratches, two rows each
+    scratch_ys = _rng.integers(0, 510, size=5)
+    img_array[scratch_ys[:, None] + np.arange(2), :] = 20
+    
+    return img_array
+
+def _probe_path(path):
+    """Return (path, stat result or None, entry count for directories)"""
+    # One stat answers exists / isdir / size
+    try:
+        st = os.stat(path)
+    except OSError:
+        return path, None, None
+    
+    if stat.S_ISDIR(st.st_mode):
+        with os.scandir(path) as it:
+            return path, st, sum(1 for _ in it)
+    return path, st, None
 
 def check_model_files():
     """Check if required model files exist"""
@@ -47,26 +71,31 @@ def check_model_files():
         "photo_restoration/Global/checkpoints"
     ]
     
+    # Probe all paths concurrently (stat and readdir release the GIL), then
+    # report in order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        probes = list(executor.map(_probe_path, required_files))
+    
     all_exist = True
-    for file_path in required_files:
-        if os.path.exists(file_path):
-            if os.path.isdir(file_path):
-                contents = os.listdir(file_path)
-                print(f"✅ {file_path} (directory with {len(contents)} items)")
-                if len(contents) == 0:
-                    print(f"   ⚠️  Warning: Directory is empty!")
-                    all_exist = False
-            else:
-                size = os.path.getsize(file_path)
-                print(f"✅ {file_path} ({size} bytes)")
-        else:
+    for file_path, st, entry_count in probes:
+        if st is None:
             print(f"❌ {file_path} (missing)")
             all_exist = False
+        elif entry_count is not None:
+            print(f"✅ {file_path} (directory with {entry_count} items)")
+            if entry_count == 0:
+                print(f"   ⚠️  Warning: Directory is empty!")
+                all_exist = False
+        else:
+            print(f"✅ {file_path} ({st.st_size} bytes)")
     
     return all_exist
 
 def test_photo_restoration():
     """Test the photo restoration process"""
+    # Imported here so the helpers above can be used without loading the runner
+    from photo_restoration_runner import restore_photos, make_grid
+    
     print("Testing Photo Restoration Process")
     print("=" * 40)
     
@@ -91,6 +120,8 @@ def test_photo_restoration():
     # Create test image
     print("📸 Creating test image...")
     test_image = create_test_image()
+    # OpenCV encodes from BGR channel order
+    test_image_bgr = cv2.cvtColor(test_image, cv2.COLOR_RGB2BGR)
     
     # Create temporary directories
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -100,9 +131,9 @@ def test_photo_restoration():
         os.makedirs(input_dir, exist_ok=True)
         os.makedirs(output_dir, exist_ok=True)
         
-        # Save test image
+        # Save test image, encoding straight from the array
         input_path = os.path.join(input_dir, "test_image.jpg")
-        test_image.save(input_path)
+        cv2.imwrite(input_path, test_image_bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])
         
         print(f"✅ Saved test image to: {input_path}")
         print(f"📁 Input directory contents: {os.listdir(input_dir)}")
@@ -123,8 +154,16 @@ def test_photo_restoration():
             print("❌ Restoration failed!")
             return False
         
+        # Read the whole output tree in one walk; the report below is built
+        # from this map of relative path -> (subdirectories, files)
+        tree = {os.path.relpath(dirpath, output_dir): (dirnames, filenames)
+                for dirpath, dirnames, filenames in os.walk(output_dir)}
+        
         # Check output
-        print(f"📁 Output directory contents: {os.listdir(output_dir) if os.path.exists(output_dir) else 'Output dir not found'}")
+        if "." in tree:
+            print(f"📁 Output directory contents: {tree['.'][0] + tree['.'][1]}")
+        else:
+            print("📁 Output directory contents: Output dir not found")
         
         # Check each stage directory
         stage_dirs = [
@@ -135,19 +174,19 @@ def test_photo_restoration():
         ]
         
         for stage_dir in stage_dirs:
-            stage_path = os.path.join(output_dir, stage_dir)
-            if os.path.exists(stage_path):
-                contents = os.listdir(stage_path)
-                print(f"📁 {stage_dir}: {len(contents)} items")
-                if contents:
-                    print(f"   Contents: {contents}")
-                    
-                    # Check subdirectories
-                    for item in contents:
-                        item_path = os.path.join(stage_path, item)
-                        if os.path.isdir(item_path):
-                            sub_contents = os.listdir(item_path)
-                            print(f"   📂 {item}/: {sub_contents}")
+            if stage_dir not in tree:
+                continue
+            subdirs, files = tree[stage_dir]
+            contents = subdirs + files
+            print(f"📁 {stage_dir}: {len(contents)} items")
+            if contents:
+                print(f"   Contents: {contents}")
+                
+                # Check subdirectories
+                for item in subdirs:
+                    # Symlinked directories are not walked into
+                    sub_subdirs, sub_files = tree.get(os.path.join(stage_dir, item), ([], []))
+                    print(f"   📂 {item}/: {sub_subdirs + sub_files}")
         
         # Look for results in various possible locations
         possible_output_dirs = [
@@ -159,44 +198,45 @@ def test_photo_restoration():
             os.path.join(output_dir, "stage_3_face_output", "each_img")
         ]
         
+        # Index the files in those folders by name, straight from the walk
+        # above, so finding the result is a dictionary lookup
+        priority = {os.path.normpath(d): i for i, d in enumerate(possible_output_dirs)}
+        file_index = defaultdict(list)
+        for rel_dir, (_, files) in tree.items():
+            full_dir = os.path.normpath(os.path.join(output_dir, rel_dir))
+            if full_dir in priority:
+                for file in files:
+                    file_index[file].append(os.path.join(full_dir, file))
+        
+        # Look for the restored image, falling back to any image file
+        candidates = file_index.get("test_image.jpg") or [
+            path for file, paths in file_index.items()
+            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))
+            for path in paths
+        ]
+        
         restored_image = None
-        for output_subdir in possible_output_dirs:
-            print(f"🔍 Checking: {output_subdir}")
-            if os.path.exists(output_subdir):
-                print(f"✅ Found: {output_subdir}")
-                contents = os.listdir(output_subdir)
-                print(f"📄 Contents: {contents}")
-                
-                # Look for restored image
-                restored_path = os.path.join(output_subdir, "test_image.jpg")
-                if os.path.exists(restored_path):
-                    print(f"✅ Found restored image: {restored_path}")
-                    restored_image = Image.open(restored_path)
-                    break
-                else:
-                    # Check for any image files
-                    for file in contents:
-                        if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-                            restored_path = os.path.join(output_subdir, file)
-                            print(f"✅ Found image file: {restored_path}")
-                            restored_image = Image.open(restored_path)
-                            break
-                    if restored_image:
-                        break
+        if candidates:
+            # Prefer the earliest folder in possible_output_dirs
+            restored_path = min(candidates, key=lambda path: priority[os.path.dirname(path)])
+            print(f"✅ Found restored image: {restored_path}")
+            restored_image = Image.open(restored_path)
         
         if restored_image:
             print("✅ Successfully found restored image!")
             print("🖼️ Creating comparison...")
             
-            # Create comparison
-            comparison = make_grid(test_image, restored_image)
-            
-            # Save results for inspection
+            # Save results for inspection, the restored image at full size
+            # before it is used for the comparison
             results_dir = "test_results"
             os.makedirs(results_dir, exist_ok=True)
-            
-            test_image.save(os.path.join(results_dir, "original.jpg"))
             restored_image.save(os.path.join(results_dir, "restored.jpg"))
+            
+            # Create comparison (make_grid works on PIL images)
+            comparison = make_grid(Image.fromarray(test_image), restored_image)
+            
+            cv2.imwrite(os.path.join(results_dir, "original.jpg"), test_image_bgr,
+                        [cv2.IMWRITE_JPEG_QUALITY, 90])
             comparison.save(os.path.join(results_dir, "comparison.jpg"))
             
             print(f"✅ Test completed successfully!")